@@ -1,6 +1,6 @@
 from ryu.base import app_manager
 from ryu.controller import ofp_event
-from ryu.controller.handler import MAIN_DISPATCHER, CONFIG_DISPATCHER
+from ryu.controller.handler import MAIN_DISPATCHER, CONFIG_DISPATCHER, DEAD_DISPATCHER
 from ryu.controller.handler import set_ev_cls
 from ryu.ofproto import ofproto_v1_3
 from ryu.lib.mac import haddr_to_bin
@@ -9,21 +9,57 @@ from ryu.lib.packet import ethernet
 from ryu.lib.packet import ether_types
 from ryu.topology import event, switches
 from ryu.topology.api import get_switch, get_link
+import logging
+import socket
+import struct
 import networkx as nx
-import matplotlib.pyplot as plt
 from ryu.lib.packet import arp, ipv4
 from ryu.ofproto import ofproto_v1_3_parser
 from ryu.lib import hub
 
 
+# Ethernet + ARP header layout of an ARP reply, zero-padded to the 60-byte
+# Ethernet minimum like ryu's ethernet.serialize() does
+ARP_REPLY_FORMAT = struct.Struct('!6s6sHHHBBH6s4s6s4s18x')
+
+
+# Build a raw ARP reply telling dst (the requester) that src_ip is at src_mac
+def build_arp_reply(src_mac, src_ip, dst_mac, dst_ip):
+    return ARP_REPLY_FORMAT.pack(
+        haddr_to_bin(dst_mac), haddr_to_bin(src_mac), ether_types.ETH_TYPE_ARP,
+        arp.ARP_HW_TYPE_ETHERNET, ether_types.ETH_TYPE_IP, 6, 4, arp.ARP_REPLY,
+        haddr_to_bin(src_mac), socket.inet_aton(src_ip),
+        haddr_to_bin(dst_mac), socket.inet_aton(dst_ip))
+
+
 class SimpleSwitch(app_manager.RyuApp):
     OFP_VERSIONS = [ofproto_v1_3.OFP_VERSION]
 
+    # Packet-ins with these ethertypes are dropped before any parsing
+    IGNORED_ETHER_TYPES = (ether_types.ETH_TYPE_IPV6, ether_types.ETH_TYPE_LLDP)
+
     def __init__(self, *args, **kwargs):
         super(SimpleSwitch, self).__init__(*args, **kwargs)
         self.topology_api_app = self
         self.topology = nx.DiGraph()
         self.ports_tx_stat = {}
+
+        # Connected datapaths by dpid
+        self.datapaths = {}
+
+        # Flat (u, v) -> out_port view of the graph edges for the hot path
+        self.out_port = {}
+
+        # (dpid, src_ip, dst_ip) -> out_port of path entries currently on the switches
+        self._installed = {}
+
+        # Shortest paths from each source, served from cache until the graph or its delays change
+        self._sssp = {}
+        # Sources queried once since the last invalidation
+        self._queried_sources = set()
+        # (src_ip, dst_ip) -> [(dpid, out_port, reverse_out_port), ...] along the cached path
+        self._path_hops = {}
+
         self.monitor_thread = hub.spawn(self._monitor)
 
         # Service rate = 10 Mbit/s
@@ -53,6 +89,7 @@ class SimpleSwitch(app_manager.RyuApp):
     def _port_stats_reply_handler(self, ev):
         body = ev.msg.body
         dpid = ev.msg.datapath.id
+        delays_changed = False
         
         for stat in body:
             port_no = stat.port_no
@@ -78,7 +115,7 @@ class SimpleSwitch(app_manager.RyuApp):
                 ro = throughput / self.SERVICE_RATE
 
                 if ro > 1:
-                    print(f"Ro over 1, changing to 0.99")
+                    self.logger.debug("Ro over 1 on port %s switch %s, changing to 0.99", port_no, dpid)
                     ro = 0.99
 
                 # Delay calculated using M/M/1/K formula from 03_04_Metryki_qos,page 45
@@ -94,12 +131,55 @@ class SimpleSwitch(app_manager.RyuApp):
                 edge_data = self.topology[dpid][neighbor]
                 if edge_data['out_port'] == port_no:
                     self.topology[dpid][neighbor]['throughput'] = throughput
-                    self.topology[dpid][neighbor]['delay'] = delay
+                    if edge_data['delay'] != delay:
+                        self.topology[dpid][neighbor]['delay'] = delay
+                        delays_changed = True
 
-                    # print(f"Throughput on port {port_no} switch {dpid}: {throughput}")
-                    # print(f"Delay on port {port_no} switch {dpid}: {delay}")           
-           
                     break
+
+        if delays_changed:
+            self._invalidate_paths()
+
+    # Add a graph edge and keep the flat out_port view in sync
+    def _add_edge(self, u, v, **attrs):
+        self.topology.add_edge(u, v, **attrs)
+        self.out_port[(u, v)] = attrs['out_port']
+
+    # Drop cached paths, called whenever the graph or edge delays change
+    def _invalidate_paths(self):
+        self._sssp.clear()
+        self._queried_sources.clear()
+        self._path_hops.clear()
+
+    # Delay-weighted shortest path from src_ip to dst_ip. The first query from a
+    # source uses a bidirectional search, which settles fewer nodes than a full
+    # single-source run; a repeat query from the same source computes and caches
+    # paths to every destination at once.
+    def _shortest_path(self, src_ip, dst_ip):
+        paths = self._sssp.get(src_ip)
+        if paths is None:
+            if src_ip not in self._queried_sources:
+                self._queried_sources.add(src_ip)
+                _, path = nx.bidirectional_dijkstra(self.topology, src_ip, dst_ip, weight = 'delay')
+                return path
+
+            _, paths = nx.single_source_dijkstra(self.topology, src_ip, weight = 'delay')
+            self._sssp[src_ip] = paths
+
+        return paths[dst_ip]
+
+    # Switches on the path with their output ports towards dst_ip and back
+    # towards src_ip, resolved once per path instead of on every packet-in
+    def _hops(self, src_ip, dst_ip):
+        key = (src_ip, dst_ip)
+        hops = self._path_hops.get(key)
+        if hops is None:
+            path = self._shortest_path(src_ip, dst_ip)
+            hops = [(switch, self.out_port[(switch, next_hop)], self.out_port[(switch, prev_hop)])
+                    for prev_hop, switch, next_hop in zip(path, path[1:], path[2:])]
+            self._path_hops[key] = hops
+
+        return hops
     
     # Switch connects to the controller, controller is gathering topology info
     @set_ev_cls(event.EventSwitchEnter)
@@ -117,15 +197,25 @@ class SimpleSwitch(app_manager.RyuApp):
 
         links_list = get_link(self.topology_api_app, None)
         for link in links_list:
-            self.topology.add_edge(link.src.dpid, link.dst.dpid, delay = 1, out_port = link.src.port_no, throughput = 0)
-        
-        # Print DiGraph for debbuging purposes
-        # print("DiGraph as text:")
-        # for node in self.topology.nodes(data=True):
-        #     node_id, node_attr = node
-        #     print(f"Node {node_id}: {node_attr}")
-        #     for neighbor, edge_attr in self.topology[node_id].items():
-        #         print(f"  -> {neighbor}: {edge_attr}")
+            self._add_edge(link.src.dpid, link.dst.dpid, delay = 1, out_port = link.src.port_no, throughput = 0)
+
+        self._invalidate_paths()
+        self._installed.clear()
+
+    # Forget datapaths of disconnected switches
+    @set_ev_cls(ofp_event.EventOFPStateChange, DEAD_DISPATCHER)
+    def state_change_handler(self, ev):
+        datapath = ev.datapath
+        if datapath.id is not None:
+            self.datapaths.pop(datapath.id, None)
+            self._installed = {key: port for key, port in self._installed.items() if key[0] != datapath.id}
+
+    # Forget expired path entries so the next packet-in reinstalls them
+    @set_ev_cls(ofp_event.EventOFPFlowRemoved, MAIN_DISPATCHER)
+    def flow_removed_handler(self, ev):
+        msg = ev.msg
+        key = (msg.datapath.id, msg.match.get('ipv4_src'), msg.match.get('ipv4_dst'))
+        self._installed.pop(key, None)
 
     # Install table-miss flow entry for the new switch
     @set_ev_cls(ofp_event.EventOFPSwitchFeatures, CONFIG_DISPATCHER)
@@ -134,6 +224,8 @@ class SimpleSwitch(app_manager.RyuApp):
         ofproto = datapath.ofproto
         parser = datapath.ofproto_parser
 
+        self.datapaths[datapath.id] = datapath
+
         match = parser.OFPMatch()
         actions = [parser.OFPActionOutput(ofproto.OFPP_CONTROLLER,
                                           ofproto.OFPCML_NO_BUFFER)]
@@ -142,6 +234,15 @@ class SimpleSwitch(app_manager.RyuApp):
         self.logger.info(f"Switch {datapath.id}: Zainstalowano Table-Miss Flow (domyślne wysyłanie do kontrolera)")
 
     def add_flow(self, datapath, priority, match, actions, buffer_id=None, idle_timeout = 0):
+        mod = self.build_flow_mod(datapath, priority, match, actions, buffer_id, idle_timeout)
+        datapath.send_msg(mod)
+
+    # Send several FlowMods to one switch back-to-back
+    def add_flows(self, datapath, mods):
+        for mod in mods:
+            datapath.send_msg(mod)
+
+    def build_flow_mod(self, datapath, priority, match, actions, buffer_id=None, idle_timeout = 0, flags = 0):
         ofproto = datapath.ofproto
         parser = datapath.ofproto_parser
 
@@ -151,21 +252,20 @@ class SimpleSwitch(app_manager.RyuApp):
             mod = parser.OFPFlowMod(datapath=datapath, buffer_id=buffer_id,
                                     priority=priority, match=match,
                                     instructions=inst,
-                                    idle_timeout = idle_timeout)
+                                    idle_timeout = idle_timeout,
+                                    flags = flags)
         else:
             mod = parser.OFPFlowMod(datapath=datapath, priority=priority,
                                     match=match, instructions=inst,
-                                    idle_timeout = idle_timeout)
-        datapath.send_msg(mod)
+                                    idle_timeout = idle_timeout,
+                                    flags = flags)
+        return mod
 
-    # Inject packet into the network
-    def send_packet_out(self, datapath, port, pkt):
+    # Inject raw frame into the network
+    def send_packet_out(self, datapath, port, data):
         ofproto = datapath.ofproto
         parser = datapath.ofproto_parser
         
-        pkt.serialize()
-        data = pkt.data
-        
         actions = [parser.OFPActionOutput(port)]
         
         out = parser.OFPPacketOut(datapath=datapath,
@@ -182,61 +282,36 @@ class SimpleSwitch(app_manager.RyuApp):
         msg = ev.msg
         datapath = msg.datapath
         in_port = msg.match['in_port']
+
+        #Ignore IPv6 and LLDP Packet-ins, reading the ethertype straight from the frame
+        ethertype, = struct.unpack_from('!H', msg.data, 12)
+        if ethertype in self.IGNORED_ETHER_TYPES:
+            return
+
         pkt = packet.Packet(msg.data)
         eth = pkt.get_protocol(ethernet.ethernet)
         arp_pkt = pkt.get_protocol(arp.arp)
         ipv4_pkt = pkt.get_protocol(ipv4.ipv4)
-
-
-        #Ignore IPv6 Packet-ins
-        ETHER_TYPE_IPV6 = 0x86DD
-        if eth.ethertype == ETHER_TYPE_IPV6:
-            return
-
-        #Ignore LLDP Packet-ins
-        ETHER_TYPE_LLDP = 0x88cc
-        if eth.ethertype == ETHER_TYPE_LLDP:
-            return
         
-        # self.logger.info(f"Packet-in from switch {datapath.id}, port {in_port}, eth_type={eth.ethertype}")
-        # print(f"{eth = }")
-        # print(f"{pkt = }")
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Packet-in from switch %s, port %s: eth=%s pkt=%s", datapath.id, in_port, eth, pkt)
 
 
         if arp_pkt:
-            self.topology.add_node(arp_pkt.src_ip, mac = arp_pkt.src_mac)
-            self.topology.add_edge(arp_pkt.src_ip, datapath.id, delay = 1, out_port = in_port, throughput = 0)
-            self.topology.add_edge(datapath.id, arp_pkt.src_ip, delay = 1, out_port = in_port, throughput = 0)
+            # Only a new or moved host changes the graph and stale cached paths
+            if self.out_port.get((datapath.id, arp_pkt.src_ip)) != in_port:
+                self._invalidate_paths()
 
-            # Print DiGraph for debbuging purposes
-            # print("DiGraph as text:")
-            # for node in self.topology.nodes(data=True):
-            #     node_id, node_attr = node
-            #     print(f"Node {node_id}: {node_attr}")
-            #     for neighbor, edge_attr in self.topology[node_id].items():
-            #         print(f"  -> {neighbor}: {edge_attr}")
-
-            ARP_REQUEST = 1
-            ARP_REPLY = 2
+            self.topology.add_node(arp_pkt.src_ip, mac = arp_pkt.src_mac)
+            self._add_edge(arp_pkt.src_ip, datapath.id, delay = 1, out_port = in_port, throughput = 0)
+            self._add_edge(datapath.id, arp_pkt.src_ip, delay = 1, out_port = in_port, throughput = 0)
 
-            if arp_pkt.opcode == ARP_REQUEST and arp_pkt.dst_ip in self.topology:
+            if arp_pkt.opcode == arp.ARP_REQUEST and arp_pkt.dst_ip in self.topology:
                 dst_mac = self.topology.nodes[arp_pkt.dst_ip]["mac"]
 
-                pkt_reply = packet.Packet()
-                
-                pkt_reply.add_protocol(ethernet.ethernet(
-                    ethertype=ether_types.ETH_TYPE_ARP,
-                    dst=arp_pkt.src_mac,
-                    src=dst_mac))
+                reply = build_arp_reply(dst_mac, arp_pkt.dst_ip, arp_pkt.src_mac, arp_pkt.src_ip)
                 
-                pkt_reply.add_protocol(arp.arp(
-                    opcode=ARP_REPLY,
-                    src_mac=dst_mac,
-                    src_ip=arp_pkt.dst_ip,
-                    dst_mac=arp_pkt.src_mac,
-                    dst_ip=arp_pkt.src_ip))
-                
-                self.send_packet_out(datapath, in_port, pkt_reply)
+                self.send_packet_out(datapath, in_port, reply)
             
                 return
             
@@ -244,36 +319,37 @@ class SimpleSwitch(app_manager.RyuApp):
             src_ip = ipv4_pkt.src
             dst_ip = ipv4_pkt.dst
 
-            dijkstra_path = nx.dijkstra_path(self.topology, source = src_ip, target = dst_ip, weight = 'delay')
-            intermediate_switches_on_djkstr_pth = dijkstra_path[1:-1]
-            # print(f"{dijkstra_path = }")
-            # print(f"{intermediate_switches_on_djkstr_pth = }")
-
-            # Add flow on every switch on the path
-            for switch in intermediate_switches_on_djkstr_pth:
-                switch_index = dijkstra_path.index(switch)
-                next_hop_index = switch_index + 1
-                next_hop = dijkstra_path[next_hop_index]
+            hops = self._hops(src_ip, dst_ip)
 
-                out_port = self.topology[switch][next_hop]['out_port']
-
-                switch_obj_list = get_switch(self.topology_api_app, dpid=switch)
-                datapath_obj = switch_obj_list[0].dp
+            # Add flow on every switch on the path, in both directions so that
+            # return traffic (e.g. TCP ACKs) doesn't trigger its own packet-ins
+            for switch, out_port, reverse_out_port in hops:
+                datapath_obj = self.datapaths[switch]
 
                 parser = datapath_obj.ofproto_parser
-
-                match = parser.OFPMatch(
-                    eth_type=ether_types.ETH_TYPE_IP,
-                    ipv4_src=src_ip,
-                    ipv4_dst=dst_ip
-                )
-        
-                actions = [parser.OFPActionOutput(out_port)]
-
-                self.add_flow(datapath_obj, 1, match, actions, idle_timeout = 5)
+                flags = datapath_obj.ofproto.OFPFF_SEND_FLOW_REM
+
+                mods = []
+                for flow_src, flow_dst, port in ((src_ip, dst_ip, out_port), (dst_ip, src_ip, reverse_out_port)):
+                    # Skip entries the switch already holds with the same output port
+                    key = (switch, flow_src, flow_dst)
+                    if self._installed.get(key) == port:
+                        continue
+                    self._installed[key] = port
+
+                    match = parser.OFPMatch(
+                        eth_type=ether_types.ETH_TYPE_IP,
+                        ipv4_src=flow_src,
+                        ipv4_dst=flow_dst
+                    )
+                    actions = [parser.OFPActionOutput(port)]
+
+                    mods.append(self.build_flow_mod(datapath_obj, 1, match, actions, idle_timeout = 5, flags = flags))
+
+                if mods:
+                    self.add_flows(datapath_obj, mods)
             
             #After adding flows, let the first packet go along the path
-            next_hop = dijkstra_path[dijkstra_path.index(datapath.id) + 1]
-            first_hop_out_port = self.topology[datapath.id][next_hop]['out_port']
-            self.send_packet_out(datapath, first_hop_out_port, pkt)
+            first_hop_out_port = next(port for switch, port, _ in hops if switch == datapath.id)
+            self.send_packet_out(datapath, first_hop_out_port, msg.data)
             
\ No newline at end of file
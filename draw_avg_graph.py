@@ -1,45 +1,51 @@
 import os
 import re
-import glob
+import numpy as np
 import matplotlib.pyplot as plt
 
+# Regex matches lines like:
+# [  3]  0.0- 1.0 sec  1.12 MBytes  9.44 Mbits/sec
+# Group 1: Interval End Time (e.g., "1.0")
+# Group 2: Bandwidth Value (e.g., "9.44")
+# Group 3: Unit prefix (e.g., "M" for "Mbits/sec")
+_INTERVAL_RE = re.compile(r"-\s*(\d+(?:\.\d+)?)\s+sec.*?(\d+(?:\.\d+)?)\s+([KMG])bits\/sec")
+
+_NATURAL_SPLIT_RE = re.compile(r"([0-9]+)")
+
 def natural_sort_key(s):
-    return [int(text) if text.isdigit() else text.lower()
-            for text in re.split('([0-9]+)', s)]
+    return tuple(int(text) if text.isdigit() else text.lower()
+                 for text in _NATURAL_SPLIT_RE.split(s))
 
 def parse_iperf_intervals(filepath):
-
-    # Regex matches lines like:
-    # [  3]  0.0- 1.0 sec  1.12 MBytes  9.44 Mbits/sec
-    # Group 1: Interval End Time (e.g., "1.0")
-    # Group 2: Bandwidth Value (e.g., "9.44")
-    # Group 3: Unit (e.g., "Mbits/sec")
-    regex = r"-\s*(\d+(?:\.\d+)?)\s+sec.*?(\d+(?:\.\d+)?)\s+([KMG]bits\/sec)"
-    
-    data_points = []
+    """
+    Returns (times, bandwidths) as NumPy arrays, bandwidth in Mbit/s.
+    """
+    times = []
+    bws = []
+    units = []
     
     try:
         with open(filepath, 'r') as f:
             for line in f:
-                match = re.search(regex, line)
+                match = _INTERVAL_RE.search(line)
                 if match:
                     # We use the end of the interval as the timestamp
-                    local_time = float(match.group(1))
-                    val = float(match.group(2))
-                    unit = match.group(3)
-                    
-                    # Normalize to Mbit/s
-                    if unit == "Gbits/sec":
-                        val *= 1000
-                    elif unit == "Kbits/sec":
-                        val /= 1000
-                    
-                    data_points.append((local_time, val))
+                    times.append(match.group(1))
+                    bws.append(match.group(2))
+                    units.append(match.group(3))
     except Exception as e:
         print(f"Error reading {filepath}: {e}")
-        return []
+        return np.empty(0), np.empty(0)
 
-    return data_points
+    times = np.asarray(times, dtype=float)
+    bws = np.asarray(bws, dtype=float)
+    units = np.asarray(units)
+
+    # Normalize to Mbit/s
+    bws[units == "G"] *= 1000
+    bws[units == "K"] /= 1000
+
+    return times, bws
 
 def main():
     target_folder = 'our_algorithm'
@@ -49,10 +55,10 @@ def main():
         print(f"Error: Folder '{target_folder}' not found.")
         return
 
-    # Get files and sort them naturally
-    files = glob.glob(os.path.join(target_folder, '*'))
-    files = [f for f in files if os.path.isfile(f)]
-    files.sort(key=lambda x: natural_sort_key(os.path.basename(x)))
+    # Get files (skipping hidden ones, like the old '*' glob) and sort them naturally
+    with os.scandir(target_folder) as it:
+        files = [e for e in it if e.is_file() and not e.name.startswith('.')]
+    files.sort(key=lambda e: natural_sort_key(e.name))
 
     if not files:
         print("No files found in directory.")
@@ -60,11 +66,12 @@ def main():
 
     print(f"Found {len(files)} files. Plotting timeline...")
 
-    plt.figure(figsize=(14, 7))
+    fig = plt.figure(figsize=(14, 7))
     
     # Iterate through sorted files
-    for i, filepath in enumerate(files):
-        filename = os.path.basename(filepath)
+    for i, entry in enumerate(files):
+        filepath = entry.path
+        filename = entry.name
         label_name = os.path.splitext(filename)[0]
         
         # Calculate the global start time for this specific file
@@ -72,15 +79,14 @@ def main():
         global_offset = i * start_delay_seconds
         
         # Extract local data points
-        local_data = parse_iperf_intervals(filepath)
+        times, y_values = parse_iperf_intervals(filepath)
         
-        if not local_data:
+        if not times.size:
             print(f"Warning: No valid data found in {filename}")
             continue
             
         # Adjust time by adding the global offset
-        x_values = [t + global_offset for t, bw in local_data]
-        y_values = [bw for t, bw in local_data]
+        x_values = times + global_offset
         
         # Plot this pair's line
         plt.plot(x_values, y_values, label=label_name, linewidth=2)
@@ -97,9 +103,13 @@ def main():
     plt.tight_layout()
     
     output_image = 'throughput_timeline.png'
-    plt.savefig(output_image)
+    fig.savefig(output_image)
     print(f"Graph saved as '{output_image}'")
-    plt.show()
+
+    # Only block on a GUI window when there is a display to show it on
+    if os.environ.get('DISPLAY'):
+        plt.show()
+    plt.close(fig)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -3,38 +3,54 @@ import os
 import time
 import random
 import json
+import mmap
 import re
+from itertools import combinations
 from mininet.net import Mininet
 from mininet.node import RemoteController, OVSKernelSwitch
 from mininet.link import TCLink
 from mininet.log import setLogLevel, info
 from topology.geant_topology import Geant
 
+# Regex to capture bandwidth (e.g., "9.62 Mbits/sec")
+# Matches: number + space + unit/sec
+_SUMMARY_RE = re.compile(rb"(\d+(?:\.\d+)?\s+[KMG]bits\/sec)")
+
 
 def parse_iperf_throughput(filename):
     """
     Parses the iperf output file to extract the bandwidth.
     Looks for the summary line usually at the end of the file.
     """
-    if not os.path.exists(filename):
+    if not os.path.exists(filename) or os.path.getsize(filename) == 0:
         return "0.0 Mbit/s"
 
     last_throughput = "0.0 Mbit/s"
-    
-    # Regex to capture bandwidth (e.g., "9.62 Mbits/sec")
-    # Matches: number + space + unit/sec
-    regex = r"(\d+(?:\.\d+)?\s+[KMG]bits\/sec)"
-
-    with open(filename, 'r') as f:
-        content = f.read()
-        matches = re.findall(regex, content)
-        if matches:
+
+    # Scan the mapped file and keep only the last match instead of
+    # reading it whole and building a list of every match
+    with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, prot=mmap.PROT_READ) as mm:
+        last = None
+        for last in _SUMMARY_RE.finditer(mm):
+            pass
+        if last is not None:
             # Usually the last match is the average if running -t
             # We normalize 'sec' to 's' to match your requested format
-            last_throughput = matches[-1].replace("sec", "s")
+            last_throughput = last.group(1).decode().replace("sec", "s")
     
     return last_throughput
 
+def broadcast_cmd(hosts, cmd):
+    """
+    Runs the same command on several hosts at once.
+    sendCmd() doesn't wait for the shell prompt, so all hosts work in
+    parallel and a single pass of waitOutput() collects the results.
+    """
+    hosts = list(hosts)
+    for h in hosts:
+        h.sendCmd(cmd)
+    return {h: h.waitOutput() for h in hosts}
+
 def wait_for_enter():
     print("\n" + "#"*40)
     input("  PRESS ENTER TO START THE SCENARIO  ")
@@ -58,9 +74,8 @@ def run_geant_scenario():
 
     # 3. Connectivity Check
     info('*** Running ping for host discovery\n')
-    for host_src in net.hosts:
-            result = host_src.cmd(f'ping -c 1 10.0.0.200')
-            print(f"{host_src} completed")
+    for host_src in broadcast_cmd(net.hosts, 'ping -c 1 10.0.0.200'):
+        print(f"{host_src} completed")
 
 
     # wait_for_enter()
@@ -76,27 +91,13 @@ def run_geant_scenario():
         net.stop()
         return
 
-    # Generate all possible unique pairs
-    all_pairs = []
-    host_indices = list(range(len(hosts)))
-    random.shuffle(host_indices)
-    
-    # We strictly need 10 pairs. 
-    # Logic: Pick random source, pick random dest (not same), ensure uniqueness.
-    # To keep it simple and robust:
-    unique_pairs = []
-    attempt_limit = 1000
-    attempts = 0
-
-    while len(unique_pairs) < 10 and attempts < attempt_limit:
-        h1 = random.choice(hosts)
-        h2 = random.choice(hosts)
-        
-        if h1 != h2:
-            pair = (h1, h2)
-            if pair not in unique_pairs and (h2, h1) not in unique_pairs:
-                unique_pairs.append(pair)
-        attempts += 1
+    # Draw 10 distinct unordered pairs in one shot, then pick a random
+    # direction for each so either host can end up as the iperf client
+    all_pairs = list(combinations(hosts, 2))
+    unique_pairs = [
+        (h1, h2) if random.random() < 0.5 else (h2, h1)
+        for h1, h2 in random.sample(all_pairs, min(10, len(all_pairs)))
+    ]
     
     if len(unique_pairs) < 10:
         info(f'*** Warning: Only could generate {len(unique_pairs)} unique pairs.\n')
@@ -107,13 +108,14 @@ def run_geant_scenario():
     # We run iperf for a long duration (-t 300) so they stay active
     # We will kill them manually when the scenario ends.
     output_files = {} # Store file paths to parse later
+
+    # Start one server (in background) per destination host, a single
+    # iperf -s accepts all clients that target it
+    broadcast_cmd({dst for _, dst in unique_pairs}, 'iperf -s &')
     
     for i, (src, dst) in enumerate(unique_pairs, start=1):
         info(f'*** Starting Pair {i}: {src.name} -> {dst.name}\n')
         
-        # Start Server (in background)
-        dst.cmd('iperf -s &')
-        
         # Define output file for this pair
         outfile = f'iperf_pair_{i}.txt'
         output_files[i] = outfile
@@ -135,8 +137,7 @@ def run_geant_scenario():
     # 8. End Scenario and Cleanup
     info('*** Stopping Iperf processes\n')
     # Sending kill signals to hosts to stop iperf
-    for h in hosts:
-        h.cmd('killall -9 iperf')
+    broadcast_cmd(hosts, 'killall -9 iperf')
     
     # 9. Save Results
     info('*** Parsing results\n')
@@ -1,9 +1,18 @@
 import argparse
 import json
+import os
 import random
 import re
+import selectors
 import time
-from subprocess import PIPE, STDOUT, TimeoutExpired
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from subprocess import DEVNULL, PIPE, STDOUT, TimeoutExpired
+from types import MappingProxyType
+
+try:
+    import orjson  # optional, much faster than stdlib json on big -J outputs
+except ImportError:
+    orjson = None
 
 from mininet.net import Mininet
 from mininet.node import RemoteController, OVSKernelSwitch
@@ -12,65 +21,99 @@ from mininet.log import setLogLevel, info
 
 from topology.ssp_topology import SSPTopo
 
-PING_RTT_RE = re.compile(r"rtt min/avg/max/mdev = ([\d.]+)/([\d.]+)/([\d.]+)/([\d.]+) ms")
-PING_STAT_RE = re.compile(r"(\d+)\s+packets transmitted,\s+(\d+)\s+received.*?(\d+)%\s+packet loss")
+PING_RTT_RE = re.compile(r"rtt [a-z/]+ = ([\d.]+)/([\d.]+)/([\d.]+)/([\d.]+) ms")
+# [^%]* can't run past the loss figure, and ([\d.]+) keeps fractional losses (e.g. 16.6667%) whole
+PING_STAT_RE = re.compile(r"(\d+) packets transmitted, (\d+) received[^%]*?([\d.]+)% packet loss")
 
 DEFAULT_FAIL_MODE = "secure"
 ENABLE_OVS_RSTP_STP = True
 ENABLE_PRELEARN = True
+# Unused address: pinging it only makes a host send an ARP the controller learns from
+DISCOVERY_IP = "10.0.0.200"
 
 
 def enable_ovs_loop_protection(net):
     """Force OF13 + fail-mode and (R)STP on all bridges to prevent loops."""
-    for sw in net.switches:
-        sw.cmd(f"ovs-vsctl set bridge {sw.name} protocols=OpenFlow13")
-        sw.cmd(f"ovs-vsctl set-fail-mode {sw.name} {DEFAULT_FAIL_MODE}")
-        if ENABLE_OVS_RSTP_STP:
-            sw.cmd(
-                "sh -lc "
-                f"\"ovs-vsctl set bridge {sw.name} rstp_enable=true 2>/dev/null "
-                f"|| ovs-vsctl set bridge {sw.name} stp_enable=true 2>/dev/null\""
-            )
+    if not net.switches:
+        return
+
+    # One ovs-vsctl transaction covers every bridge instead of 2-3 calls per switch
+    base = " ".join(
+        f"-- set bridge {sw.name} protocols=OpenFlow13 -- set-fail-mode {sw.name} {DEFAULT_FAIL_MODE}"
+        for sw in net.switches
+    )
+    cmd = f"ovs-vsctl {base}"
+    if ENABLE_OVS_RSTP_STP:
+        rstp = " ".join(f"-- set bridge {sw.name} rstp_enable=true" for sw in net.switches)
+        stp = " ".join(f"-- set bridge {sw.name} stp_enable=true" for sw in net.switches)
+        # Without RSTP support the whole transaction fails, so fall back to STP for all
+        cmd += f"; ovs-vsctl {rstp} 2>/dev/null || ovs-vsctl {stp} 2>/dev/null"
+
+    # Bridges live in the root namespace, any switch's shell can run it
+    net.switches[0].cmd(cmd)
+
+
+# Numeric ToS:
+# - EF DSCP 46 -> 184
+# - AF41 DSCP 34 -> 136
+# Read-only, shared by every caller of profiles_from_csv
+_PROFILE_TABLE = MappingProxyType({
+    "voip": MappingProxyType({"name": "voip", "proto": "udp", "bitrate": "128K", "length": 160, "tos": 184}),
+    "video": MappingProxyType({"name": "video", "proto": "udp", "bitrate": "8M", "length": 1200, "tos": 136}),
+    "bulk": MappingProxyType({"name": "bulk", "proto": "tcp", "tos": 0}),
+})
 
 
 def profiles_from_csv(csv: str):
-    """
-    Numeric ToS:
-    - EF DSCP 46 -> 184
-    - AF41 DSCP 34 -> 136
-    """
+    """Look up the comma-separated profile names in _PROFILE_TABLE."""
     out = []
     for p in [x.strip().lower() for x in csv.split(",") if x.strip()]:
-        if p == "voip":
-            out.append({"name": "voip", "proto": "udp", "bitrate": "128K", "length": 160, "tos": 184})
-        elif p == "video":
-            out.append({"name": "video", "proto": "udp", "bitrate": "8M", "length": 1200, "tos": 136})
-        elif p == "bulk":
-            out.append({"name": "bulk", "proto": "tcp", "tos": 0})
-        else:
-            raise ValueError(f"Unknown profile: {p}")
+        try:
+            out.append(_PROFILE_TABLE[p])
+        except KeyError:
+            raise ValueError(f"Unknown profile: {p}") from None
     return out
 
 
 def random_pairs(hosts, n_pairs: int, seed: int):
     """Pick random distinct (src,dst) pairs. Reproducible via seed."""
     rng = random.Random(seed)
-    names = [h.name for h in hosts]
-    pairs = set()
-    cap = min(n_pairs, len(names) * (len(names) - 1))
-    while len(pairs) < cap:
-        a = rng.choice(names)
-        b = rng.choice(names)
-        if a != b:
-            pairs.add((a, b))
-    by = {h.name: h for h in hosts}
-    return [(by[a], by[b]) for (a, b) in list(pairs)[:n_pairs]]
-
-
-def quick_ping_ok(src, dst_ip: str) -> bool:
-    """Fast connectivity check to avoid long hangs when topology isn't ready."""
-    out = src.cmd(f"ping -c 1 -W 1 {dst_ip}")
-    return "1 received" in out or "0% packet loss" in out
+    hosts = list(hosts)
+    n = len(hosts)
+    cap = min(n_pairs, n * (n - 1))
+    pairs = []
+    # Draw distinct indices of the n*(n-1) ordered pairs in one call (no
+    # rejection, no set), then decode k -> (a, b) with b skipping over a.
+    # Order follows the draw, so it only depends on the seed
+    for k in rng.sample(range(n * (n - 1)), cap):
+        a, b = divmod(k, n - 1)
+        if b >= a:
+            b += 1
+        pairs.append((hosts[a], hosts[b]))
+    return pairs
+
+
+def quick_ping_ok(ping_proc, timeout_s: float = 1.5) -> bool:
+    """
+    Fast connectivity check to avoid long hangs when topology isn't ready.
+    Watches the already running ping monitor for its first reply, so the same
+    process goes on to measure RTT during load. Only per-reply lines are
+    consumed here; the summary parse_ping_output needs comes at exit.
+    """
+    fd = ping_proc.stdout.fileno()
+    seen = b""
+    deadline = time.monotonic() + timeout_s
+    with selectors.DefaultSelector() as sel:
+        sel.register(fd, selectors.EVENT_READ)
+        while b" bytes from " not in seen:
+            left = deadline - time.monotonic()
+            if left <= 0 or not sel.select(left):
+                return False
+            chunk = os.read(fd, 4096)
+            if not chunk:  # ping exited
+                return False
+            seen += chunk
+    return True
 
 
 def parse_ping_output(out: str) -> dict:
@@ -90,7 +133,7 @@ def parse_ping_output(out: str) -> dict:
             "ok": False,
             "tx": int(s.group(1)),
             "rx": int(s.group(2)),
-            "loss_pct": int(s.group(3)),
+            "loss_pct": float(s.group(3)),
         }
     return {"ok": False}
 
@@ -103,12 +146,49 @@ def start_ping_monitor(src, dst_ip: str, duration_s: int):
     """
     deadline = max(2, duration_s + 2)
     cmd = f"ping -i 0.2 -W 1 -w {deadline} {dst_ip}"
-    return src.popen(cmd, stdout=PIPE, stderr=STDOUT, text=True)
+    return src.popen(cmd, stdout=PIPE, stderr=DEVNULL, text=True)
 
 
 def start_iperf_server(dst, port: int):
     """Start iperf3 server that exits after one client."""
-    return dst.popen(f"iperf3 -s -1 -p {port}", stdout=PIPE, stderr=STDOUT, text=True)
+    # Server output is never read, let the kernel drop it instead of filling a pipe
+    return dst.popen(f"iperf3 -s -1 -p {port}", stdout=DEVNULL, stderr=DEVNULL)
+
+
+def start_iperf_servers(dst, profs, port_base: int, flavor: str):
+    """
+    iperf3: one single-shot server per profile (it serves one client at a time).
+    iperf2: one threaded server per protocol on port_base serves every profile.
+    """
+    if flavor == "iperf2":
+        protos = sorted({p["proto"] for p in profs})
+        return [
+            dst.popen(f"iperf -s {'-u ' if proto == 'udp' else ''}-p {port_base}", stdout=DEVNULL, stderr=DEVNULL)
+            for proto in protos
+        ]
+    return [start_iperf_server(dst, port_base + i) for i, _ in enumerate(profs)]
+
+
+def listening_ports(dst) -> set:
+    """(proto, port) pairs bound on dst, from one `ss` snapshot."""
+    _, out = wait_communicate(dst.popen("ss -Hltun", stdout=PIPE, stderr=STDOUT, text=True), 2)
+    ports = set()
+    for line in out.splitlines():
+        f = line.split()
+        if len(f) >= 5 and f[4].rpartition(":")[2].isdigit():
+            ports.add((f[0], int(f[4].rpartition(":")[2])))
+    return ports
+
+
+def wait_servers_bound(dst, expected: set, timeout_s: float = 2.0) -> bool:
+    """Poll `ss` until every expected (proto, port) is bound, instead of a blind sleep."""
+    deadline = time.monotonic() + timeout_s
+    while True:
+        if expected <= listening_ports(dst):
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.02)
 
 
 def start_iperf_client(src, dst_ip: str, duration_s: int, port: int, prof: dict):
@@ -121,10 +201,59 @@ def start_iperf_client(src, dst_ip: str, duration_s: int, port: int, prof: dict)
     return src.popen(cmd, stdout=PIPE, stderr=STDOUT, text=True)
 
 
+def start_iperf2_client(src, dst_ip: str, duration_s: int, port: int, prof: dict):
+    """Start iperf2 client for given profile (CSV output)."""
+    tos = prof["tos"]
+    if prof["proto"] == "tcp":
+        cmd = f"iperf -c {dst_ip} -p {port} -t {duration_s} -S {tos} -y C"
+    else:
+        cmd = f"iperf -c {dst_ip} -p {port} -t {duration_s} -u -b {prof['bitrate']} -l {prof['length']} -S {tos} -y C"
+    return src.popen(cmd, stdout=PIPE, stderr=STDOUT, text=True)
+
+
+def parse_iperf2_client_csv(out: str, prof: dict) -> dict:
+    """
+    Return compact iperf2 metrics from client CSV, same keys as the iperf3 parser.
+    Rows: ts,src,sport,dst,dport,id,interval,bytes,bps[,jitter_ms,lost,total,lost_pct,ooo]
+    The longer row is the UDP server report relayed back to the client.
+    """
+    rows = [line.split(",") for line in out.splitlines() if line.count(",") >= 8]
+    if not rows:
+        return {"ok": False, "error": "bad_csv"}
+
+    try:
+        if prof["proto"] == "tcp":
+            return {
+                "ok": True,
+                "proto": "tcp",
+                "throughput_bps": float(rows[-1][8]),
+                "retransmits": None,
+            }
+
+        report = next((r for r in reversed(rows) if len(r) >= 13), None)
+        if report is None:
+            return {
+                "ok": True,
+                "proto": "udp",
+                "throughput_bps": float(rows[-1][8]),
+                "jitter_ms": None,
+                "lost_percent": None,
+            }
+        return {
+            "ok": True,
+            "proto": "udp",
+            "throughput_bps": float(report[8]),
+            "jitter_ms": float(report[9]),
+            "lost_percent": float(report[12]),
+        }
+    except ValueError:
+        return {"ok": False, "error": "bad_csv"}
+
+
 def parse_iperf3_client_json(out: str, prof: dict) -> dict:
     """Return compact iperf3 metrics from client JSON."""
     try:
-        j = json.loads(out)
+        j = orjson.loads(out) if orjson is not None else json.loads(out)
     except Exception:
         return {"ok": False, "error": "bad_json"}
 
@@ -167,48 +296,159 @@ def wait_communicate(proc, timeout_s: int):
         return False, (out or "")
 
 
-def run_parallel_bundle(src, dst, profs, duration_s: int, port_base: int):
+def drain_procs(procs, deadline: float):
     """
-    Run ALL iperf3 profiles in parallel between src->dst AND run ping during load.
-    Returns: (ping_during_stats, flows_metrics_list)
+    Read every proc's stdout in one selector loop until all hit EOF or the
+    monotonic deadline passes; procs still running then are killed.
+    Returns [(ok, output_text)] in procs order.
     """
-    dst_ip = dst.IP()
+    bufs = {p: bytearray() for p in procs}
+    sel = selectors.DefaultSelector()
+    for p in procs:
+        sel.register(p.stdout.fileno(), selectors.EVENT_READ, p)
+    try:
+        while sel.get_map():
+            left = deadline - time.monotonic()
+            if left <= 0:
+                break
+            for key, _ in sel.select(left):
+                chunk = os.read(key.fd, 65536)
+                if chunk:
+                    bufs[key.data] += chunk
+                else:
+                    sel.unregister(key.fd)
+        pending = {key.data for key in sel.get_map().values()}
+    finally:
+        sel.close()
 
-    # Start iperf3 servers first
-    servers = []
-    for i, _ in enumerate(profs):
-        servers.append(start_iperf_server(dst, port_base + i))
-    time.sleep(0.4)  # give servers time to bind
+    results = []
+    for p in procs:
+        ok = p not in pending
+        try:
+            p.wait(timeout=max(0, deadline - time.monotonic()) if ok else 0)
+        except TimeoutExpired:
+            ok = False
+            p.kill()
+            p.wait()
+        p.stdout.close()
+        results.append((ok, bufs[p].decode(errors="replace")))
+    return results
 
-    # Start ping monitor (during load)
-    ping_proc = start_ping_monitor(src, dst_ip, duration_s)
+
+def run_parallel_bundle(src, dst, dst_ip: str, profs, duration_s: int, port_base: int, ping_proc, flavor: str = "iperf3"):
+    """
+    Run ALL iperf profiles in parallel between src->dst while ping_proc
+    (started by the caller) measures RTT during load.
+    Returns: (ping_during_stats, flows_metrics_list)
+    """
+    iperf2 = flavor == "iperf2"
+
+    # Start iperf servers first
+    servers = start_iperf_servers(dst, profs, port_base, flavor)
+    if iperf2:
+        expected = {(p["proto"], port_base) for p in profs}
+    else:
+        # iperf3 listens on TCP even for UDP tests (control channel)
+        expected = {("tcp", port_base + i) for i, _ in enumerate(profs)}
+    if not wait_servers_bound(dst, expected):
+        info(f"    ! {dst.name}: iperf servers not bound after 2s, starting clients anyway\n")
 
     # Start all clients (parallel load)
     clients = []
     for i, prof in enumerate(profs):
-        clients.append((prof, start_iperf_client(src, dst_ip, duration_s, port_base + i, prof)))
+        if iperf2:
+            clients.append((prof, start_iperf2_client(src, dst_ip, duration_s, port_base, prof)))
+        else:
+            clients.append((prof, start_iperf_client(src, dst_ip, duration_s, port_base + i, prof)))
+
+    # Wait for clients and ping. They run concurrently, so they share one
+    # deadline and are drained together instead of one communicate() each
+    deadline = time.monotonic() + duration_s + 20
+    *outputs, (ping_ok, ping_out) = drain_procs([cli for _, cli in clients] + [ping_proc], deadline)
 
-    # Wait for clients
     flows = []
-    client_timeout = duration_s + 20
-    for prof, cli in clients:
-        ok, out = wait_communicate(cli, client_timeout)
+    for (prof, _), (ok, out) in zip(clients, outputs):
         if not ok:
             flows.append({"profile": prof["name"], "metrics": {"ok": False, "error": "timeout"}})
+        elif iperf2:
+            flows.append({"profile": prof["name"], "metrics": parse_iperf2_client_csv(out, prof)})
         else:
             flows.append({"profile": prof["name"], "metrics": parse_iperf3_client_json(out, prof)})
 
-    # Drain/stop ping
-    ping_ok, ping_out = wait_communicate(ping_proc, duration_s + 5)
     ping_stats = parse_ping_output(ping_out) if ping_ok else {"ok": False}
 
-    # Best-effort drain servers
+    # Best-effort reap servers (iperf2 servers don't exit on their own)
     for srv in servers:
-        wait_communicate(srv, 2)
+        if iperf2:
+            srv.terminate()
+        try:
+            srv.wait(timeout=2)
+        except TimeoutExpired:
+            srv.kill()
+            srv.wait()
 
     return ping_stats, flows
 
 
+def prelearn_pairs(pairs, ip_by_name: dict) -> float:
+    """
+    Prelearn only the hosts the test uses, then ping every selected
+    (src, dst) once. Returns the loss percent of the pair pings.
+    """
+    # The controller learns a host only from an ARP it sends and drops ARP
+    # requests for unknown targets, so every endpoint (destinations too) must
+    # ARP first; one discovery ping each, like final_scenario.py
+    endpoints = {h for pair in pairs for h in pair}
+    drain_procs(
+        [h.popen(f"ping -c 1 -W 1 {DISCOVERY_IP}", stdout=PIPE, stderr=STDOUT) for h in endpoints],
+        time.monotonic() + 5,
+    )
+
+    procs = [src.popen(f"ping -c 1 -W 1 {ip_by_name[dst.name]}", stdout=PIPE, stderr=STDOUT) for src, dst in pairs]
+    received = 0
+    for _, out in drain_procs(procs, time.monotonic() + 5):
+        s = PING_STAT_RE.search(out)
+        if s:
+            received += int(s.group(2))
+    return 100.0 * (len(pairs) - received) / len(pairs) if pairs else 0.0
+
+
+def append_ndjson(f, obj):
+    """Append one JSON line and push it to disk, so it survives a crash."""
+    f.write((orjson.dumps(obj).decode() if orjson is not None else json.dumps(obj, ensure_ascii=False)) + "\n")
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def run_pair(i: int, n_pairs: int, src, dst, dst_ip: str, profs, duration_s: int, flavor: str) -> dict:
+    """Run one pair's bundle; returns its results["tests"] entry."""
+    info(f"\n*** Pair {i+1}/{n_pairs}: {src.name} -> {dst.name}\n")
+
+    # Start ping monitor first; its first reply doubles as the quick
+    # pre-check so we don't waste time if topology still unstable
+    ping_proc = start_ping_monitor(src, dst_ip, duration_s)
+    if not quick_ping_ok(ping_proc):
+        ping_proc.kill()
+        wait_communicate(ping_proc, 2)
+        info(f"    ! {src.name} -> {dst.name}: quick ping failed -> skipping bundle\n")
+        return {
+            "pair": {"src": src.name, "dst": dst.name},
+            "ping_during": {"ok": False},
+            "flows": [{"profile": p["name"], "metrics": {"ok": False, "error": "no_connectivity"}} for p in profs],
+        }
+
+    # Unique port block per pair (avoids collisions/timewait issues)
+    port_base = 5201 + i * 50
+
+    ping_during, flows = run_parallel_bundle(src, dst, dst_ip, profs, duration_s, port_base, ping_proc, flavor)
+
+    return {
+        "pair": {"src": src.name, "dst": dst.name},
+        "ping_during": ping_during,
+        "flows": flows,
+    }
+
+
 def main():
     parser = argparse.ArgumentParser(description="GEANT Mininet traffic generator (parallel flows + ping under load).")
     parser.add_argument("--controller-ip", default="172.16.0.2")
@@ -218,8 +458,13 @@ def main():
     parser.add_argument("--duration", type=int, default=10)
     parser.add_argument("--seed", type=int, default=42)
     parser.add_argument("--profiles", default="voip,video,bulk")
+    parser.add_argument("--parallel-pairs", type=int, default=1, help="Number of pair bundles run concurrently")
+    parser.add_argument("--iperf-flavor", default="iperf3", choices=["iperf3", "iperf2"],
+                        help="iperf2 serves all profiles of a pair from one server per protocol")
 
     parser.add_argument("--warmup", type=int, default=0)
+    parser.add_argument("--prelearn-full", action="store_true",
+                        help="Prelearn with pingAll() instead of pinging only the selected pairs")
     parser.add_argument("--out", default="results.json")
     parser.add_argument("--log", default="info", choices=["debug", "info", "warning", "error"])
     args = parser.parse_args()
@@ -244,17 +489,25 @@ def main():
 
     enable_ovs_loop_protection(net)
 
+    # Host IPs don't change once the net is up, resolve them once
+    ip_by_name = {h.name: h.IP() for h in net.hosts}
+
     if args.warmup > 0:
         info(f"*** Warmup sleep: {args.warmup}s\n")
         time.sleep(args.warmup)
 
-    if ENABLE_PRELEARN:
-        info("*** Prelearn: pingAll()\n")
-        loss = net.pingAll()
-        info(f"*** pingAll loss: {loss}%\n")
-
     pairs = random_pairs(net.hosts, args.pairs, args.seed)
 
+    if ENABLE_PRELEARN:
+        if args.prelearn_full:
+            info("*** Prelearn: pingAll()\n")
+            loss = net.pingAll()
+            info(f"*** pingAll loss: {loss}%\n")
+        else:
+            info(f"*** Prelearn: pinging {len(pairs)} selected pairs\n")
+            loss = prelearn_pairs(pairs, ip_by_name)
+            info(f"*** Prelearn loss: {loss:.0f}%\n")
+
     results = {
         "meta": {
             "controller": {"ip": args.controller_ip, "port": args.controller_port},
@@ -262,37 +515,39 @@ def main():
             "duration_s": args.duration,
             "seed": args.seed,
             "profiles": [p["name"] for p in profs],
+            "iperf_flavor": args.iperf_flavor,
             "warmup_s": args.warmup,
         },
         "tests": [],
     }
 
+    # Every finished pair is also streamed to <out>.ndjson (meta line first,
+    # then {"index", "test"} in finish order) so a crash keeps what ran
+    stream_out = args.out + ".ndjson"
+
+    # Bundles use disjoint port blocks and separate processes, so they can run
+    # side by side; entries are kept in pair order regardless of finish order
+    tests = {}
     try:
-        for i, (src, dst) in enumerate(pairs):
-            info(f"\n*** Pair {i+1}/{len(pairs)}: {src.name} -> {dst.name}\n")
-
-            # quick pre-check so we don't waste time if topology still unstable
-            if not quick_ping_ok(src, dst.IP()):
-                info("    ! quick ping failed -> skipping bundle\n")
-                results["tests"].append({
-                    "pair": {"src": src.name, "dst": dst.name},
-                    "ping_during": {"ok": False},
-                    "flows": [{"profile": p["name"], "metrics": {"ok": False, "error": "no_connectivity"}} for p in profs],
-                })
-                continue
-
-            # Unique port block per pair (avoids collisions/timewait issues)
-            port_base = 5201 + i * 50
-
-            ping_during, flows = run_parallel_bundle(src, dst, profs, args.duration, port_base)
-
-            results["tests"].append({
-                "pair": {"src": src.name, "dst": dst.name},
-                "ping_during": ping_during,
-                "flows": flows,
-            })
+        with open(stream_out, "w", encoding="utf-8") as stream, \
+                ThreadPoolExecutor(max_workers=max(1, args.parallel_pairs)) as ex:
+            append_ndjson(stream, {"meta": results["meta"]})
+            futures = {
+                ex.submit(run_pair, i, len(pairs), src, dst, ip_by_name[dst.name], profs, args.duration, args.iperf_flavor): i
+                for i, (src, dst) in enumerate(pairs)
+            }
+            try:
+                for fut in as_completed(futures):
+                    i = futures[fut]
+                    tests[i] = fut.result()
+                    append_ndjson(stream, {"index": i, "test": tests[i]})
+            except BaseException:
+                # Error or Ctrl-C: drop queued pairs, only wait for running ones
+                ex.shutdown(wait=False, cancel_futures=True)
+                raise
 
     finally:
+        results["tests"] = [tests[i] for i in sorted(tests)]
         info("\n*** Stopping network\n")
         net.stop()
         with open(args.out, "w", encoding="utf-8") as f:
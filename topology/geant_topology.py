@@ -1,9 +1,36 @@
 #!/usr/bin/python3
+from functools import lru_cache, partial
+
 from mininet.node import OVSKernelSwitch
 from mininet.topo import Topo
 from mininet.link import TCLink
 
 
+# Core links (switch-switch), by switch id; addLink order sets port numbering
+GEANT_EDGES = (
+    (1, 7), (2, 4), (2, 7), (2, 18), (2, 23), (2, 11),
+    (2, 6), (3, 21), (4, 14), (4, 20), (5, 8), (5, 16),
+    (5, 11), (6, 19), (6, 13), (6, 18), (7, 21), (7, 18),
+    (8, 9), (8, 20), (10, 16), (11, 20), (11, 21), (11, 22),
+    (11, 16), (12, 22), (15, 20), (17, 23), (18, 21), (22, 23),
+)
+
+
+def _canonical_links(raw):
+    """Return raw links as sorted (low, high) pairs, rejecting duplicates."""
+    seen = set()
+    for a, b in raw:
+        key = (a, b) if a < b else (b, a)
+        if key in seen:
+            raise ValueError(f"duplicate link s{a}-s{b}")
+        seen.add(key)
+    return tuple(sorted(seen))
+
+
+# Canonical form for lookups; building it fails the import on a duplicate link
+GEANT_LINKS = _canonical_links(GEANT_EDGES)
+
+
 def _linkopts(bw=None, delay=None, loss=None):
     """Build TCLink options dict, skipping None values."""
     opts = {}
@@ -31,63 +58,38 @@ class Geant(Topo):
     def __init__(self, host_bw=None, host_delay=None, core_bw=None, core_delay=None, loss=0):
         super().__init__()
 
-        s = {}
-        h = {}
+        s = [None]  # indexed by switch id, s[0] unused
+
+        # Link options are the same for every link of a kind, build them once
+        access_link = partial(self.addLink, cls=TCLink, **_linkopts(bw=host_bw, delay=host_delay, loss=loss))
+        core_link = partial(self.addLink, cls=TCLink, **_linkopts(bw=core_bw, delay=core_delay, loss=loss))
 
         # Switches + hosts
         for i in range(1, 24):
             sname = f"s{i}"
             hname = f"h{i}"
-            s[sname] = self.addSwitch(
+            s.append(self.addSwitch(
                 sname,
                 cls=OVSKernelSwitch,
                 protocols="OpenFlow13",  # important for Ryu apps that expect OF1.3
-            )
-            h[hname] = self.addHost(
+                batch=True,  # one ovs-vsctl call for all bridges at net.start()
+            ))
+            host = self.addHost(
                 hname,
                 ip=f"10.0.0.{i}/24",
             )
 
             # Host-access link
-            self.addLink(
-                h[hname], s[sname],
-                cls=TCLink,
-                **_linkopts(bw=host_bw, delay=host_delay, loss=loss)
-            )
+            access_link(host, s[i])
 
         # Core links (switch-switch)
-        core = _linkopts(bw=core_bw, delay=core_delay, loss=loss)
-
-        self.addLink(s["s1"], s["s7"], cls=TCLink, **core)
-        self.addLink(s["s2"], s["s4"], cls=TCLink, **core)
-        self.addLink(s["s2"], s["s7"], cls=TCLink, **core)
-        self.addLink(s["s2"], s["s18"], cls=TCLink, **core)
-        self.addLink(s["s2"], s["s23"], cls=TCLink, **core)
-        self.addLink(s["s2"], s["s11"], cls=TCLink, **core)
-        self.addLink(s["s2"], s["s6"], cls=TCLink, **core)
-        self.addLink(s["s3"], s["s21"], cls=TCLink, **core)
-        self.addLink(s["s4"], s["s14"], cls=TCLink, **core)
-        self.addLink(s["s4"], s["s20"], cls=TCLink, **core)
-        self.addLink(s["s5"], s["s8"], cls=TCLink, **core)
-        self.addLink(s["s5"], s["s16"], cls=TCLink, **core)
-        self.addLink(s["s5"], s["s11"], cls=TCLink, **core)
-        self.addLink(s["s6"], s["s19"], cls=TCLink, **core)
-        self.addLink(s["s6"], s["s13"], cls=TCLink, **core)
-        self.addLink(s["s6"], s["s18"], cls=TCLink, **core)
-        self.addLink(s["s7"], s["s21"], cls=TCLink, **core)
-        self.addLink(s["s7"], s["s18"], cls=TCLink, **core)
-        self.addLink(s["s8"], s["s9"], cls=TCLink, **core)
-        self.addLink(s["s8"], s["s20"], cls=TCLink, **core)
-        self.addLink(s["s10"], s["s16"], cls=TCLink, **core)
-        self.addLink(s["s11"], s["s20"], cls=TCLink, **core)
-        self.addLink(s["s11"], s["s21"], cls=TCLink, **core)
-        self.addLink(s["s11"], s["s22"], cls=TCLink, **core)
-        self.addLink(s["s11"], s["s16"], cls=TCLink, **core)
-        self.addLink(s["s12"], s["s22"], cls=TCLink, **core)
-        self.addLink(s["s15"], s["s20"], cls=TCLink, **core)
-        self.addLink(s["s17"], s["s23"], cls=TCLink, **core)
-        self.addLink(s["s18"], s["s21"], cls=TCLink, **core)
-        self.addLink(s["s22"], s["s23"], cls=TCLink, **core)
-
-
-topos = {"geant": (lambda: Geant())}
\ No newline at end of file
+        for a, b in GEANT_EDGES:
+            core_link(s[a], s[b])
+
+
+@lru_cache(maxsize=1)
+def _make_geant():
+    return Geant()
+
+
+topos = {"geant": _make_geant}
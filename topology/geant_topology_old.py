@@ -1,46 +1,49 @@
 #!/usr/bin/python
+from functools import lru_cache, partial
 from mininet.node import OVSKernelSwitch
 from mininet.topo import Topo
-from mininet.link import TCLink
+from mininet.link import Link
+
+# Core links (switch-switch), by switch id; addLink order sets port numbering
+GEANT_EDGES = (
+    (1, 7), (2, 4), (2, 7), (2, 18), (2, 23), (2, 11),
+    (2, 6), (3, 21), (4, 14), (4, 20), (5, 8), (5, 16),
+    (5, 11), (6, 19), (6, 13), (6, 18), (7, 21), (7, 18),
+    (8, 9), (8, 20), (10, 16), (11, 20), (11, 21), (11, 22),
+    (11, 16), (12, 22), (15, 20), (17, 23), (18, 21), (22, 23),
+)
+
+
+def _canonical_links(raw):
+    """Return raw links as sorted (low, high) pairs, rejecting duplicates."""
+    seen = set()
+    for a, b in raw:
+        key = (a, b) if a < b else (b, a)
+        if key in seen:
+            raise ValueError(f"duplicate link s{a}-s{b}")
+        seen.add(key)
+    return tuple(sorted(seen))
+
+
+# Canonical form for lookups; building it fails the import on a duplicate link
+GEANT_LINKS = _canonical_links(GEANT_EDGES)
 
 class Geant(Topo):
 
     def __init__(self):
         Topo.__init__(self)
 
-        s = {}
+        link = partial(self.addLink, cls=Link)
+
+        s = [None]  # indexed by switch id, s[0] unused
         for i in range(1, 24):
-            s[f's{i}'] = self.addSwitch(f's{i}', cls=OVSKernelSwitch)
-
-        self.addLink(s['s1'], s['s7'], cls=TCLink)
-        self.addLink(s['s2'], s['s4'], cls=TCLink)
-        self.addLink(s['s2'], s['s7'], cls=TCLink)
-        self.addLink(s['s2'], s['s18'], cls=TCLink)
-        self.addLink(s['s2'], s['s23'], cls=TCLink)
-        self.addLink(s['s2'], s['s11'], cls=TCLink)
-        self.addLink(s['s2'], s['s6'], cls=TCLink)
-        self.addLink(s['s3'], s['s21'], cls=TCLink)
-        self.addLink(s['s4'], s['s14'], cls=TCLink)
-        self.addLink(s['s4'], s['s20'], cls=TCLink)
-        self.addLink(s['s5'], s['s8'], cls=TCLink)
-        self.addLink(s['s5'], s['s16'], cls=TCLink)
-        self.addLink(s['s5'], s['s11'], cls=TCLink)
-        self.addLink(s['s6'], s['s19'], cls=TCLink)
-        self.addLink(s['s6'], s['s13'], cls=TCLink)
-        self.addLink(s['s6'], s['s18'], cls=TCLink)
-        self.addLink(s['s7'], s['s21'], cls=TCLink)
-        self.addLink(s['s7'], s['s18'], cls=TCLink)
-        self.addLink(s['s8'], s['s9'], cls=TCLink)
-        self.addLink(s['s8'], s['s20'], cls=TCLink)
-        self.addLink(s['s10'], s['s16'], cls=TCLink)
-        self.addLink(s['s11'], s['s20'], cls=TCLink)
-        self.addLink(s['s11'], s['s21'], cls=TCLink)
-        self.addLink(s['s11'], s['s22'], cls=TCLink)
-        self.addLink(s['s11'], s['s16'], cls=TCLink)
-        self.addLink(s['s12'], s['s22'], cls=TCLink)
-        self.addLink(s['s15'], s['s20'], cls=TCLink)
-        self.addLink(s['s17'], s['s23'], cls=TCLink)
-        self.addLink(s['s18'], s['s21'], cls=TCLink)
-        self.addLink(s['s22'], s['s23'], cls=TCLink)
-
-topos = { 'geant': (lambda: Geant() ) }
\ No newline at end of file
+            s.append(self.addSwitch(f's{i}', cls=OVSKernelSwitch, batch=True))
+
+        for a, b in GEANT_EDGES:
+            link(s[a], s[b])
+
+@lru_cache(maxsize=1)
+def _make_geant():
+    return Geant()
+
+topos = { 'geant': _make_geant }
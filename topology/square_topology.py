@@ -1,33 +1,47 @@
 #!/usr/bin/python
+from functools import lru_cache, partial
 from mininet.node import OVSKernelSwitch
 from mininet.topo import Topo
-from mininet.link import TCLink
+from mininet.link import Link
 
 class Square(Topo):
 
+    # (name, ip, mac); MACs follow the host name (h<switch>_<n> -> ..:<switch>:<n>)
+    # so they are stable across runs instead of random per net.start()
+    HOSTS = (
+        ('h1_1', "10.0.0.11/24", "00:00:00:00:01:01"),
+        ('h1_2', "10.0.0.12/24", "00:00:00:00:01:02"),
+        ('h4_1', "10.0.0.41/24", "00:00:00:00:04:01"),
+        ('h4_2', "10.0.0.42/24", "00:00:00:00:04:02"),
+    )
+
     def __init__(self):
         Topo.__init__(self)
 
-        switches = {}
+        link = partial(self.addLink, cls=Link)
+
+        switches = [None]  # indexed by switch id, switches[0] unused
         hosts = {}
 
         for i in range(1,5):
-            switches[f's{i}'] = self.addSwitch(f's{i}', cls=OVSKernelSwitch)
+            switches.append(self.addSwitch(f's{i}', cls=OVSKernelSwitch, batch=True))
+
+        for name, ip, mac in self.HOSTS:
+            hosts[name] = self.addHost(name, ip = ip, mac = mac)
 
-        hosts[f'h1_1'] = self.addHost(f'h1_1', ip = "10.0.0.11/24")
-        hosts[f'h1_2'] = self.addHost(f'h1_2', ip = "10.0.0.12/24")
-        hosts[f'h4_1'] = self.addHost(f'h4_1', ip = "10.0.0.41/24")
-        hosts[f'h4_2'] = self.addHost(f'h4_2', ip = "10.0.0.42/24")
 
+        link(switches[1], switches[2])
+        link(switches[2], switches[3])
+        link(switches[3], switches[4])
+        link(switches[4], switches[1])
 
-        self.addLink(switches['s1'], switches['s2'], cls=TCLink)
-        self.addLink(switches['s2'], switches['s3'], cls=TCLink)
-        self.addLink(switches['s3'], switches['s4'], cls=TCLink)
-        self.addLink(switches['s4'], switches['s1'], cls=TCLink)
+        link(hosts['h1_1'], switches[1])
+        link(hosts['h1_2'], switches[1])
+        link(hosts['h4_1'], switches[4])
+        link(hosts['h4_2'], switches[4])
 
-        self.addLink(hosts['h1_1'], switches['s1'], cls=TCLink)
-        self.addLink(hosts['h1_2'], switches['s1'], cls=TCLink)
-        self.addLink(hosts['h4_1'], switches['s4'], cls=TCLink)
-        self.addLink(hosts['h4_2'], switches['s4'], cls=TCLink)
+@lru_cache(maxsize=1)
+def _make_square():
+    return Square()
 
-topos = { 'square': (lambda: Square() ) }
\ No newline at end of file
+topos = { 'square': _make_square }
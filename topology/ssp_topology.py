@@ -1,14 +1,23 @@
 #!/usr/bin/python
+from functools import lru_cache, partial
 from mininet.node import OVSKernelSwitch
 from mininet.topo import Topo
 from mininet.link import TCLink
 
 class SSPTopo(Topo):
 
+    # (name, ip, mac); MACs follow the host id so they are stable across runs
+    HOSTS = (
+        ('H1', "10.0.0.1/24", "00:00:00:00:00:01"),
+        ('H2', "10.0.0.2/24", "00:00:00:00:00:02"),
+        ('H3', "10.0.0.3/24", "00:00:00:00:00:03"),
+        ('H4', "10.0.0.4/24", "00:00:00:00:00:04"),
+    )
+
     def __init__(self):
         Topo.__init__(self)
 
-        switches = {}
+        switches = [None]  # indexed by router id, switches[0] unused
         hosts = {}
 
         link_opts = dict(
@@ -17,26 +26,29 @@ class SSPTopo(Topo):
             max_queue_size=1000,  
             use_htb=True    
         )
+        link = partial(self.addLink, **link_opts)
 
         for i in range(1,5):
-            switches[f'R{i}'] = self.addSwitch(f'R{i}', cls=OVSKernelSwitch)
+            switches.append(self.addSwitch(f'R{i}', cls=OVSKernelSwitch, batch=True))
+
+        for name, ip, mac in self.HOSTS:
+            hosts[name] = self.addHost(name, ip = ip, mac = mac)
 
-        hosts[f'H1'] = self.addHost(f'H1', ip = "10.0.0.1/24")
-        hosts[f'H2'] = self.addHost(f'H2', ip = "10.0.0.2/24")
-        hosts[f'H3'] = self.addHost(f'H3', ip = "10.0.0.3/24")
-        hosts[f'H4'] = self.addHost(f'H4', ip = "10.0.0.4/24")
 
+        link(switches[1], switches[2])
+        link(switches[1], switches[3])
+        link(switches[1], switches[4])
+        link(switches[2], switches[4])
+        link(switches[3], switches[4])
 
-        self.addLink(switches['R1'], switches['R2'], **link_opts)
-        self.addLink(switches['R1'], switches['R3'], **link_opts)
-        self.addLink(switches['R1'], switches['R4'], **link_opts)
-        self.addLink(switches['R2'], switches['R4'], **link_opts)
-        self.addLink(switches['R3'], switches['R4'], **link_opts)
 
+        link(hosts['H1'], switches[1])
+        link(hosts['H3'], switches[1])
+        link(hosts['H2'], switches[4])
+        link(hosts['H4'], switches[4])
 
-        self.addLink(hosts['H1'], switches['R1'], **link_opts)
-        self.addLink(hosts['H3'], switches['R1'], **link_opts)
-        self.addLink(hosts['H2'], switches['R4'], **link_opts)
-        self.addLink(hosts['H4'], switches['R4'], **link_opts)
+@lru_cache(maxsize=1)
+def _make_ssp():
+    return SSPTopo()
 
-topos = { 'SSPTopo': (lambda: SSPTopo() ) }
\ No newline at end of file
+topos = { 'SSPTopo': _make_ssp }